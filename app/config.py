@@ -1,11 +1,21 @@
 """
 Configuration for Document AI REST API Backend (Project B)
 """
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+import logging
+from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
 
 
 class Settings(BaseSettings):
+    # All variables are read with the DOCAI_ prefix, e.g. DOCAI_GCP_PROJECT_ID
+    model_config = SettingsConfigDict(
+        env_prefix="DOCAI_",
+        env_file=".env",
+        case_sensitive=True,
+        frozen=True,
+    )
+
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
 
@@ -14,6 +24,14 @@ class Settings(BaseSettings):
     DOCUMENT_AI_LOCATION: str = "us"
     DOCUMENT_AI_FORM_PROCESSOR: str = ""
     DOCUMENT_AI_BANK_STATEMENT_PROCESSOR: str = ""
+    # gs:// prefix where batch_process_documents writes its output
+    DOCUMENT_AI_BATCH_OUTPUT_URI: str = ""
+    DOCUMENT_AI_BATCH_TIMEOUT: int = 600
+    # In-memory cache of processed GCS documents, keyed by object generation
+    DOCUMENT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    DOCUMENT_CACHE_TTL: int = 3600
+    # Worker processes for bank statement extraction; 0 runs it in a thread instead
+    EXTRACTION_WORKERS: int = 2
 
     # Cloud Storage (for gs:// paths - use Project B bucket or shared bucket)
     STORAGE_BUCKET_NAME: str = ""
@@ -22,9 +40,17 @@ class Settings(BaseSettings):
     # If set, requests must include header: X-API-Key: <value>
     API_KEY: str = ""
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+
+@lru_cache
+def get_settings() -> Settings:
+    """Return the process-wide Settings, parsing the environment and .env once."""
+    return Settings()
 
 
-settings = Settings()
+def configure_logging(level: str):
+    """Set up root logging; used by the app and by each extraction pool worker."""
+    logging.basicConfig(
+        level=getattr(logging, level),
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
@@ -5,102 +5,442 @@ Uses same extraction logic as Project A's DocumentAIService for consistent outpu
 """
 from google.cloud import documentai
 from google.cloud import storage
-from app.config import settings
+from google.protobuf import field_mask_pb2
+from cachetools import TTLCache, cached
+from app.config import get_settings
+import asyncio
+from concurrent.futures import Executor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
 import logging
-from typing import Optional, List, Any
+from functools import partial
+import re
+import threading
+from typing import Callable, Optional, List, Any
 import json
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Google API clients are expensive to build (channel setup, credential refresh),
+# so they are created once per process and shared across requests.
+_DOCAI_CLIENT = None
+_STORAGE_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+# One candidate transaction row per line: date, description, trailing amount.
+_TX_LINE_RE = re.compile(
+    r'(?P<date>\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)[ \t]+(?P<desc>.+?)[ \t]+\$?(?P<amt>-?[\d,]+\.\d{2})[ \t]*$',
+    re.M
+)
+_AMOUNT_CLEAN = re.compile(r'[\$,]')
+_AMOUNT_RE = re.compile(r'\d+\.?\d*')
+
+# Header keyword -> column role, checked in order; a header takes the first role it matches
+_HEADER_KEYWORDS = (
+    (("date", "transaction date", "posted date"), "date"),
+    (("description", "memo", "details"), "desc"),
+    (("amount", "debit", "credit", "withdrawal", "deposit"), "amount"),
+    (("type", "transaction type"), "type"),
+)
+
+# Seconds between status checks of a running batch operation
+_BATCH_POLL_INTERVAL = 5
+
+_TX_DATE_FORMATS = ('%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%m/%d')
+_DIGIT_RE = re.compile(r'\d')
+# (formats, shape) -> format that parsed the last string of that shape
+_SHAPE_TO_FMT: dict = {}
+
+
+def _shape(s: str) -> str:
+    """Fingerprint a date string by its digit/separator layout, e.g. '01/02/2024' -> 'DD/DD/DDDD'."""
+    return _DIGIT_RE.sub('D', s)
+
+
+def _parse_date(value: str, formats: tuple, memoize: bool = True):
+    """
+    Parse value with the first matching format; returns (datetime, fmt) or (None, None).
+    With memoize, the format that worked is remembered per string shape so rows
+    sharing a layout parse on the first try instead of raising ValueError per miss.
+    Only memoize format lists where every format reads fields in the same order,
+    otherwise the cached format can shadow an earlier one (e.g. %m/%d vs %d/%m).
+    """
+    key = None
+    if memoize:
+        key = (formats, _shape(value))
+        fmt = _SHAPE_TO_FMT.get(key)
+        if fmt:
+            try:
+                return datetime.strptime(value, fmt), fmt
+            except ValueError:
+                pass
+    for fmt in formats:
+        try:
+            d = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if key is not None:
+            _SHAPE_TO_FMT[key] = fmt
+        return d, fmt
+    return None, None
+
+
+def _isoize_dates(rows: list) -> list:
+    """Rewrite each row's "date" to a string in place (YYYY-MM-DD for date/datetime) and return rows."""
+    for row in rows:
+        d = row.get("date")
+        if isinstance(d, date):
+            row["date"] = d.strftime("%Y-%m-%d")
+        elif d is not None and not isinstance(d, str):
+            row["date"] = str(d)
+    return rows
+
+
+def get_docai_client() -> documentai.DocumentProcessorServiceClient:
+    """Return the shared Document AI client, creating it on first use."""
+    global _DOCAI_CLIENT
+    if _DOCAI_CLIENT is None:
+        with _CLIENT_LOCK:
+            if _DOCAI_CLIENT is None:
+                _DOCAI_CLIENT = documentai.DocumentProcessorServiceClient()
+    return _DOCAI_CLIENT
+
+
+def get_storage_client() -> storage.Client:
+    """Return the shared Cloud Storage client, creating it on first use."""
+    global _STORAGE_CLIENT
+    if _STORAGE_CLIENT is None:
+        with _CLIENT_LOCK:
+            if _STORAGE_CLIENT is None:
+                _STORAGE_CLIENT = storage.Client()
+    return _STORAGE_CLIENT
+
+
+# Only the parts of a Document the extractors read; drops page images, tokens and
+# per-element layouts, which dominate response size on multi-page statements.
+_DOCUMENT_FIELD_MASK = field_mask_pb2.FieldMask(paths=["text", "entities", "pages.tables"])
+
+# Serialized Documents, bounded by total bytes and age rather than entry count
+_DOCUMENT_CACHE = TTLCache(maxsize=settings.DOCUMENT_CACHE_MAX_BYTES, ttl=settings.DOCUMENT_CACHE_TTL, getsizeof=len)
+
+
+@cached(_DOCUMENT_CACHE, lock=threading.Lock())
+def _process_gcs_document(processor_name: str, gcs_uri: str, generation: int, mime_type: str) -> bytes:
+    """
+    Run Document AI on a GCS object and return the serialized, field-masked Document.
+    Memoized per (processor, object, generation, mime) so re-posting the same
+    unchanged file skips the RPC; generation is only used as part of the key.
+    """
+    request = documentai.ProcessRequest(
+        name=processor_name,
+        gcs_document=documentai.GcsDocument(
+            gcs_uri=gcs_uri,
+            mime_type=mime_type
+        ),
+        field_mask=_DOCUMENT_FIELD_MASK
+    )
+    result = get_docai_client().process_document(request=request)
+    return documentai.Document.serialize(result.document)
 
 
 class DocumentProcessor:
     """Processes documents with Document AI and extracts form/bank data."""
 
-    def __init__(self):
+    def __init__(self, executor_factory: Optional[Callable[[], Executor]] = None):
         self.project_id = settings.GCP_PROJECT_ID
         self.location = settings.DOCUMENT_AI_LOCATION
-        self.client = documentai.DocumentProcessorServiceClient()
+        # Optional process pool for the CPU-bound extraction step of bank statements;
+        # created on first use and recreated if a worker dies
+        self._executor_factory = executor_factory
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        # Resource names are constant per process; unconfigured types map to None
+        # so the error is still raised per request rather than at startup.
+        self._processor_names = {
+            processor_type: f"projects/{self.project_id}/locations/{self.location}/processors/{processor_id}" if processor_id else None
+            for processor_type, processor_id in (
+                ("form", settings.DOCUMENT_AI_FORM_PROCESSOR),
+                ("bank", settings.DOCUMENT_AI_BANK_STATEMENT_PROCESSOR),
+            )
+        }
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor_factory is None:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = self._executor_factory()
+            return self._executor
+
+    def _discard_executor(self, executor: Executor):
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """Shut down the extraction pool, if one was started."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    @property
+    def client(self) -> documentai.DocumentProcessorServiceClient:
+        return get_docai_client()
 
     def _get_processor_name(self, processor_type: str) -> str:
-        if processor_type == "form":
-            processor_id = settings.DOCUMENT_AI_FORM_PROCESSOR
-        elif processor_type == "bank":
-            processor_id = settings.DOCUMENT_AI_BANK_STATEMENT_PROCESSOR
-        else:
+        try:
+            name = self._processor_names[processor_type]
+        except KeyError:
             raise ValueError(f"Unknown processor type: {processor_type}")
-        if not processor_id:
+        if not name:
             raise ValueError(f"Processor ID not configured for type: {processor_type}")
-        return f"projects/{self.project_id}/locations/{self.location}/processors/{processor_id}"
-
-    def _read_file_content(self, storage_path: str) -> bytes:
-        """Read file from GCS path (gs://bucket/path)."""
-        storage_path = storage_path.replace("gs://", "")
-        bucket_name, blob_path = storage_path.split("/", 1)
-        logger.info(f"[DocumentProcessor] Reading from GCS bucket={bucket_name} blob={blob_path}")
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        content = blob.download_as_bytes()
-        logger.info(f"[DocumentProcessor] Read {len(content)} bytes from GCS")
-        return content
-
-    def process_document(self, content: bytes, processor_type: str, mime_type: str = "application/pdf"):
-        """Call Document AI to process document."""
-        processor_name = self._get_processor_name(processor_type)
-        logger.info(f"[DocumentProcessor] Calling Document AI processor={processor_name} content_size={len(content)} mime={mime_type}")
+        return name
+
+    def _normalize_gcs_uri(self, gcs_uri: str) -> str:
+        return gcs_uri if gcs_uri.startswith("gs://") else f"gs://{gcs_uri}"
+
+    def _process_gcs(self, processor_name: str, gcs_uri: str, mime_type: str) -> bytes:
+        """Return the serialized Document for a GCS object, served from cache when unchanged."""
+        bucket_name, blob_path = gcs_uri[len("gs://"):].split("/", 1)
+        # Metadata-only fetch; the generation changes whenever the object is rewritten
+        blob = get_storage_client().bucket(bucket_name).get_blob(blob_path)
+        if blob is None:
+            raise ValueError(f"File not found: {gcs_uri}")
+        logger.info("[DocumentProcessor] Calling Document AI processor=%s gcs_uri=%s generation=%s mime=%s", processor_name, gcs_uri, blob.generation, mime_type)
+        return _process_gcs_document(processor_name, gcs_uri, blob.generation, mime_type)
+
+    def _process_raw(self, processor_name: str, content: bytes, mime_type: str):
+        logger.info("[DocumentProcessor] Calling Document AI processor=%s content_size=%d mime=%s", processor_name, len(content), mime_type)
         request = documentai.ProcessRequest(
             name=processor_name,
             raw_document=documentai.RawDocument(
                 content=content,
                 mime_type=mime_type
+            ),
+            field_mask=_DOCUMENT_FIELD_MASK
+        )
+        return self.client.process_document(request=request).document
+
+    def process_document(self, content: Optional[bytes], processor_type: str, mime_type: str = "application/pdf", gcs_uri: Optional[str] = None):
+        """Call Document AI to process document.
+
+        If gcs_uri is given, Document AI reads the file straight from GCS and
+        content is ignored; results for an unchanged object are served from
+        cache. Otherwise content is sent inline as a RawDocument.
+        """
+        processor_name = self._get_processor_name(processor_type)
+        if gcs_uri:
+            document = documentai.Document.deserialize(
+                self._process_gcs(processor_name, self._normalize_gcs_uri(gcs_uri), mime_type)
+            )
+        else:
+            document = self._process_raw(processor_name, content, mime_type)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[DocumentProcessor] Document AI returned document with %d chars of text", len(document.text or ""))
+        return document
+
+    def process_document_bytes(self, content: Optional[bytes], processor_type: str, mime_type: str = "application/pdf", gcs_uri: Optional[str] = None) -> bytes:
+        """Like process_document, but return the serialized Document (e.g. to hand to another process)."""
+        processor_name = self._get_processor_name(processor_type)
+        if gcs_uri:
+            document_bytes = self._process_gcs(processor_name, self._normalize_gcs_uri(gcs_uri), mime_type)
+        else:
+            document_bytes = documentai.Document.serialize(self._process_raw(processor_name, content, mime_type))
+        logger.info("[DocumentProcessor] Document AI returned %d bytes of document", len(document_bytes))
+        return document_bytes
+
+    async def aprocess_document(self, content: Optional[bytes], processor_type: str, mime_type: str = "application/pdf", gcs_uri: Optional[str] = None):
+        """Async variant of process_document; runs the blocking RPC in a worker thread."""
+        return await asyncio.to_thread(self.process_document, content, processor_type, mime_type, gcs_uri)
+
+    def _start_batch(self, storage_paths: List[str], processor_type: str, mime_type: str):
+        """Submit one batch_process_documents request and return its long-running operation."""
+        if not storage_paths:
+            raise ValueError("storage_paths must contain at least one path")
+        if not settings.DOCUMENT_AI_BATCH_OUTPUT_URI:
+            raise ValueError("DOCUMENT_AI_BATCH_OUTPUT_URI not configured")
+        processor_name = self._get_processor_name(processor_type)
+        gcs_uris = [self._normalize_gcs_uri(p) for p in storage_paths]
+        logger.info("[DocumentProcessor] Batch processing %d documents with processor=%s", len(gcs_uris), processor_name)
+        request = documentai.BatchProcessRequest(
+            name=processor_name,
+            input_documents=documentai.BatchDocumentsInputConfig(
+                gcs_documents=documentai.GcsDocuments(
+                    documents=[documentai.GcsDocument(gcs_uri=u, mime_type=mime_type) for u in gcs_uris]
+                )
+            ),
+            document_output_config=documentai.DocumentOutputConfig(
+                gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
+                    gcs_uri=settings.DOCUMENT_AI_BATCH_OUTPUT_URI
+                )
             )
         )
-        result = self.client.process_document(request=request)
-        logger.info(f"[DocumentProcessor] Document AI returned document with {len(result.document.text) if result.document.text else 0} chars of text")
-        return result.document
+        return self.client.batch_process_documents(request=request)
+
+    def _collect_batch_results(self, operation, processor_type: str) -> List[dict]:
+        """Read and extract the output of a finished batch operation, one entry per input."""
+        metadata = documentai.BatchProcessMetadata(operation.metadata)
+        if metadata.state != documentai.BatchProcessMetadata.State.SUCCEEDED:
+            raise RuntimeError(f"Batch processing failed: {metadata.state_message}")
+        extract = self._extract_form_data if processor_type == "form" else self._extract_bank_data
+        results = []
+        for status in metadata.individual_process_statuses:
+            entry = {"storage_path": status.input_gcs_source}
+            if status.status.code != 0:
+                entry["error"] = status.status.message
+                results.append(entry)
+                continue
+            shards = self._read_batch_output(status.output_gcs_destination)
+            entry.update(self._merge_shard_results([extract(d) for d in shards]))
+            results.append(entry)
+        logger.info("[DocumentProcessor] Batch processing returned %d results", len(results))
+        return results
+
+    def batch_process(self, storage_paths: List[str], processor_type: str, mime_type: str = "application/pdf") -> List[dict]:
+        """
+        Process several GCS documents with one batch_process_documents call.
+        Document AI fans out server-side and writes results under
+        DOCUMENT_AI_BATCH_OUTPUT_URI; returns one entry per input document.
+        Blocks until the operation finishes; use abatch_process from async code.
+        """
+        operation = self._start_batch(storage_paths, processor_type, mime_type)
+        try:
+            operation.result(timeout=settings.DOCUMENT_AI_BATCH_TIMEOUT)
+        except FuturesTimeoutError:
+            self._cancel_batch(operation)
+            raise
+        return self._collect_batch_results(operation, processor_type)
+
+    async def abatch_process(self, storage_paths: List[str], processor_type: str, mime_type: str = "application/pdf") -> List[dict]:
+        """
+        Async variant of batch_process. The operation is polled with asyncio.sleep
+        in between, so no thread is held while Document AI works on the batch.
+        """
+        operation = await asyncio.to_thread(self._start_batch, storage_paths, processor_type, mime_type)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.DOCUMENT_AI_BATCH_TIMEOUT
+        while not await asyncio.to_thread(operation.done):
+            if loop.time() >= deadline:
+                await asyncio.to_thread(self._cancel_batch, operation)
+                raise TimeoutError(f"Batch processing did not finish within {settings.DOCUMENT_AI_BATCH_TIMEOUT}s")
+            await asyncio.sleep(_BATCH_POLL_INTERVAL)
+        return await asyncio.to_thread(self._collect_batch_results, operation, processor_type)
+
+    def _cancel_batch(self, operation):
+        """Cancel a batch operation that ran past its deadline so it stops writing output."""
+        try:
+            operation.cancel()
+        except Exception:
+            logger.warning("[DocumentProcessor] Could not cancel batch operation", exc_info=True)
+
+    def _read_batch_output(self, output_uri: str) -> list:
+        """
+        Load the (possibly sharded) Document JSON files written for one batch input,
+        then delete them; results are returned to the caller, not kept in GCS.
+        """
+        bucket_name, prefix = output_uri.replace("gs://", "").split("/", 1)
+        # Trailing slash so input ".../1" does not also match ".../10", ".../11", ...
+        prefix = prefix.rstrip("/") + "/"
+        blobs = sorted(get_storage_client().list_blobs(bucket_name, prefix=prefix), key=lambda b: b.name)
+        documents = [
+            documentai.Document.from_json(blob.download_as_bytes(), ignore_unknown_fields=True)
+            for blob in blobs
+            if blob.name.endswith(".json")
+        ]
+        for blob in blobs:
+            try:
+                blob.delete()
+            except Exception:
+                logger.warning("[DocumentProcessor] Could not delete batch output gs://%s/%s", bucket_name, blob.name, exc_info=True)
+        return documents
+
+    def _merge_shard_results(self, shard_results: List[dict]) -> dict:
+        """Combine per-shard results: concatenate lists, keep the first non-empty scalar."""
+        merged = {}
+        for r in shard_results:
+            for k, v in r.items():
+                if isinstance(v, list):
+                    merged.setdefault(k, []).extend(v)
+                elif not merged.get(k):
+                    merged[k] = v
+        return merged
 
     def process_form(self, storage_path: str = None, content: bytes = None, mime_type: str = "application/pdf") -> dict:
         """Process application form and return extracted data."""
-        if storage_path:
-            content = self._read_file_content(storage_path)
-        if not content:
+        if not storage_path and not content:
             raise ValueError("Either storage_path or content must be provided")
-        document = self.process_document(content, "form", mime_type)
+        document = self.process_document(content, "form", mime_type, gcs_uri=storage_path)
+        return self._extract_form_data(document)
+
+    async def aprocess_form(self, storage_path: str = None, content: bytes = None, mime_type: str = "application/pdf") -> dict:
+        """Async variant of process_form."""
+        if not storage_path and not content:
+            raise ValueError("Either storage_path or content must be provided")
+        document = await self.aprocess_document(content, "form", mime_type, gcs_uri=storage_path)
         return self._extract_form_data(document)
 
     def process_bank_statement(self, storage_path: str = None, content: bytes = None, mime_type: str = "application/pdf") -> dict:
         """Process bank statement and return extracted data."""
-        if storage_path:
-            content = self._read_file_content(storage_path)
-        if not content:
+        if not storage_path and not content:
+            raise ValueError("Either storage_path or content must be provided")
+        document = self.process_document(content, "bank", mime_type, gcs_uri=storage_path)
+        return self._extract_bank_data(document)
+
+    async def aprocess_bank_statement(self, storage_path: str = None, content: bytes = None, mime_type: str = "application/pdf") -> dict:
+        """Async variant of process_bank_statement."""
+        if not storage_path and not content:
             raise ValueError("Either storage_path or content must be provided")
-        document = self.process_document(content, "bank", mime_type)
+        executor = self._get_executor()
+        if executor is None:
+            document = await self.aprocess_document(content, "bank", mime_type, gcs_uri=storage_path)
+            return await asyncio.to_thread(self._extract_bank_data, document)
+        # Serialized bytes come straight from the cache (GCS) or are serialized in the
+        # worker thread (upload), so no proto work happens on the event loop
+        document_bytes = await asyncio.to_thread(self.process_document_bytes, content, "bank", mime_type, storage_path)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, _extract_bank_data_from_bytes, document_bytes)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool for later requests and finish this one in-process
+            logger.warning("[DocumentProcessor] Extraction pool broken, recreating and extracting in-process")
+            self._discard_executor(executor)
+            return await asyncio.to_thread(_extract_bank_data_from_bytes, document_bytes)
+
+    def _extract_bank_data(self, document) -> dict:
+        ff_lc, ent_lc = self._build_indexes(document)
+        field = partial(self._extract_field, document, ff_lc, ent_lc)
         transactions = self._extract_transactions(document)
         daily_balances = self._extract_daily_balances(document)
-        if not transactions and hasattr(document, 'text') and document.text:
-            transactions = self._parse_transactions_from_text(document.text)
+        if not transactions:
+            text = getattr(document, 'text', None)
+            if text:
+                transactions = self._parse_transactions_from_text(text)
         return {
-            "account_number": self._extract_field(document, "account_number"),
-            "routing_number": self._extract_field(document, "routing_number"),
-            "bank_name": self._extract_field(document, "bank_name"),
+            "account_number": field("account_number"),
+            "routing_number": field("routing_number"),
+            "bank_name": field("bank_name"),
             "statement_period_start": (
-                self._extract_field(document, "statement_start_date") or
-                self._extract_field(document, "statement_period_start") or
-                self._extract_field(document, "period_start")
+                field("statement_start_date") or
+                field("statement_period_start") or
+                field("period_start")
             ),
             "statement_period_end": (
-                self._extract_field(document, "statement_end_date") or
-                self._extract_field(document, "statement_period_end") or
-                self._extract_field(document, "period_end")
+                field("statement_end_date") or
+                field("statement_period_end") or
+                field("period_end")
             ),
             "opening_balance": (
-                self._extract_field(document, "starting_balance") or
-                self._extract_field(document, "opening_balance") or
-                self._extract_field(document, "beginning_balance")
+                field("starting_balance") or
+                field("opening_balance") or
+                field("beginning_balance")
             ),
             "closing_balance": (
-                self._extract_field(document, "ending_balance") or
-                self._extract_field(document, "closing_balance")
+                field("ending_balance") or
+                field("closing_balance")
             ),
             "transactions": self._serialize_transactions(transactions),
             "daily_balances": self._serialize_balances(daily_balances)
@@ -108,70 +448,45 @@ class DocumentProcessor:
 
     def _serialize_transactions(self, transactions: list) -> list:
         """Convert transaction dates to ISO strings for JSON."""
-        out = []
-        for tx in transactions:
-            t = dict(tx)
-            if "date" in t and t["date"] is not None:
-                d = t["date"]
-                if hasattr(d, "strftime"):
-                    t["date"] = d.strftime("%Y-%m-%d")
-                elif not isinstance(d, str):
-                    t["date"] = str(d)
-            out.append(t)
-        return out
+        return _isoize_dates(transactions)
 
     def _serialize_balances(self, balances: list) -> list:
-        out = []
-        for b in balances:
-            t = dict(b)
-            if "date" in t and t["date"] is not None:
-                d = t["date"]
-                if hasattr(d, "strftime"):
-                    t["date"] = d.strftime("%Y-%m-%d")
-                elif not isinstance(d, str):
-                    t["date"] = str(d)
-            out.append(t)
-        return out
+        return _isoize_dates(balances)
 
     def _extract_form_data(self, document) -> dict:
+        ff_lc, ent_lc = self._build_indexes(document)
+        field = partial(self._extract_field, document, ff_lc, ent_lc)
         extracted = {
-            "business_name": self._extract_field(document, "business_name") or self._extract_field(document, "company_name"),
-            "dba": self._extract_field(document, "dba") or self._extract_field(document, "doing_business_as"),
-            "ein": self._extract_field(document, "ein") or self._extract_field(document, "tax_id"),
-            "owner_name": self._extract_field(document, "owner_name") or self._extract_field(document, "owner"),
-            "owner_ssn": self._extract_field(document, "owner_ssn") or self._extract_field(document, "ssn"),
-            "address": self._extract_field(document, "address") or self._extract_field(document, "business_address"),
-            "phone": self._extract_field(document, "phone") or self._extract_field(document, "phone_number"),
-            "email": self._extract_field(document, "email") or self._extract_field(document, "email_address"),
-            "industry": self._extract_field(document, "industry") or self._extract_field(document, "business_type"),
-            "naics_code": self._extract_field(document, "naics_code") or self._extract_field(document, "naics"),
+            "business_name": field("business_name") or field("company_name"),
+            "dba": field("dba") or field("doing_business_as"),
+            "ein": field("ein") or field("tax_id"),
+            "owner_name": field("owner_name") or field("owner"),
+            "owner_ssn": field("owner_ssn") or field("ssn"),
+            "address": field("address") or field("business_address"),
+            "phone": field("phone") or field("phone_number"),
+            "email": field("email") or field("email_address"),
+            "industry": field("industry") or field("business_type"),
+            "naics_code": field("naics_code") or field("naics"),
             "time_in_business_months": None,
-            "start_date": self._extract_field(document, "start_date") or self._extract_field(document, "business_start_date"),
-            "requested_amount": self._extract_field(document, "requested_amount") or self._extract_field(document, "funding_amount"),
-            "business_type": self._extract_field(document, "business_type") or self._extract_field(document, "entity_type")
+            "start_date": field("start_date") or field("business_start_date"),
+            "requested_amount": field("requested_amount") or field("funding_amount"),
+            "business_type": field("business_type") or field("entity_type")
         }
         if extracted.get("start_date"):
             try:
-                from datetime import datetime
                 start_date_str = extracted["start_date"].strip()
-                date_formats = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%d-%m-%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y"]
-                start_date = None
-                for fmt in date_formats:
-                    try:
-                        start_date = datetime.strptime(start_date_str, fmt)
-                        break
-                    except ValueError:
-                        continue
+                date_formats = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%d-%m-%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y")
+                # %m/%d and %d/%m share a shape, so this list must not be memoized
+                start_date, _ = _parse_date(start_date_str, date_formats, memoize=False)
                 if start_date:
                     months = int((datetime.now() - start_date).days / 30.44)
                     extracted["time_in_business_months"] = months
             except Exception as e:
-                logger.warning(f"Error calculating TIB: {e}")
+                logger.warning("Error calculating TIB: %s", e)
         if not extracted.get("time_in_business_months"):
-            tib = self._extract_field(document, "time_in_business") or self._extract_field(document, "time_in_business_months") or self._extract_field(document, "tib")
+            tib = field("time_in_business") or field("time_in_business_months") or field("tib")
             if tib:
-                import re
-                numbers = re.findall(r'\d+\.?\d*', tib)
+                numbers = _AMOUNT_RE.findall(tib)
                 if numbers:
                     val = float(numbers[0])
                     if "year" in tib.lower():
@@ -179,55 +494,72 @@ class DocumentProcessor:
                     extracted["time_in_business_months"] = int(val)
         return extracted
 
-    def _extract_field(self, document, field_name: str) -> str:
+    def _build_indexes(self, document) -> tuple:
+        """
+        Index a document's form fields and entities by lowercased name in one pass,
+        so each _extract_field call is a dict lookup instead of a rescan.
+        Returns (ff_lc, ent_lc): name -> first form field value, type -> matching entities in order.
+        """
+        ff_lc = {}
+        ent_lc = {}
+        if not document:
+            return ff_lc, ent_lc
+        form_fields = getattr(document, 'form_fields', None)
+        if form_fields:
+            for k, v in form_fields.items():
+                ff_lc.setdefault(k.lower(), v)
+        for e in getattr(document, 'entities', None) or ():
+            type_ = getattr(e, 'type_', None)
+            if type_ is not None:
+                ent_lc.setdefault(type_.lower(), []).append(e)
+        return ff_lc, ent_lc
+
+    def _extract_field(self, document, ff_lc: dict, ent_lc: dict, field_name: str) -> str:
         if not document:
             return ""
-        if hasattr(document, 'form_fields') and document.form_fields:
-            if field_name in document.form_fields:
-                fv = document.form_fields[field_name]
-                if hasattr(fv, 'text_anchor') and fv.text_anchor:
-                    return self._extract_text_from_anchor(document, fv.text_anchor)
-                if hasattr(fv, 'value') and hasattr(fv.value, 'text_content'):
-                    return fv.value.text_content
-                if hasattr(fv, 'value'):
-                    return str(fv.value)
-            fn = field_name.lower()
-            for k, v in document.form_fields.items():
-                if k.lower() == fn:
-                    if hasattr(v, 'text_anchor') and v.text_anchor:
-                        return self._extract_text_from_anchor(document, v.text_anchor)
-                    if hasattr(v, 'value') and hasattr(v.value, 'text_content'):
-                        return v.value.text_content
-                    if hasattr(v, 'value'):
-                        return str(v.value)
-        if hasattr(document, 'entities') and document.entities:
-            for e in document.entities:
-                if hasattr(e, 'type_') and (e.type_ == field_name or e.type_.lower() == field_name.lower()):
-                    if hasattr(e, 'mention_text') and e.mention_text:
-                        return e.mention_text
-                    if hasattr(e, 'text_anchor') and e.text_anchor:
-                        t = self._extract_text_from_anchor(document, e.text_anchor)
-                        if t:
-                            return t
+        fn = field_name.lower()
+        fv = ff_lc.get(fn)
+        if fv is not None:
+            text_anchor = getattr(fv, 'text_anchor', None)
+            if text_anchor:
+                return self._extract_text_from_anchor(document, text_anchor)
+            value = getattr(fv, 'value', None)
+            if value is not None:
+                text_content = getattr(value, 'text_content', None)
+                return text_content if text_content is not None else str(value)
+        for e in ent_lc.get(fn, ()):
+            mention_text = getattr(e, 'mention_text', None)
+            if mention_text:
+                return mention_text
+            text_anchor = getattr(e, 'text_anchor', None)
+            if text_anchor:
+                t = self._extract_text_from_anchor(document, text_anchor)
+                if t:
+                    return t
         return ""
 
     def _extract_text_from_anchor(self, document, text_anchor) -> str:
-        if hasattr(text_anchor, 'content') and text_anchor.content:
-            return text_anchor.content
-        if hasattr(text_anchor, 'text_segments') and text_anchor.text_segments and hasattr(document, 'text'):
+        content = getattr(text_anchor, 'content', None)
+        if content:
+            return content
+        segments = getattr(text_anchor, 'text_segments', None)
+        text = getattr(document, 'text', None)
+        if segments and text is not None:
             parts = []
-            for seg in text_anchor.text_segments:
-                if hasattr(seg, 'start_index') and hasattr(seg, 'end_index'):
-                    try:
-                        s = int(seg.start_index) if hasattr(seg.start_index, '__int__') else seg.start_index
-                        e = int(seg.end_index) if hasattr(seg.end_index, '__int__') else seg.end_index
-                        parts.append(document.text[s:e])
-                    except (ValueError, TypeError, IndexError):
-                        pass
+            for seg in segments:
+                start = getattr(seg, 'start_index', None)
+                end = getattr(seg, 'end_index', None)
+                if start is None or end is None:
+                    continue
+                try:
+                    parts.append(text[int(start):int(end)])
+                except (ValueError, TypeError, IndexError):
+                    pass
             return " ".join(parts)
         return ""
 
     def _infer_table_section(self, header_cells: list) -> Optional[str]:
+        """Map already-lowercased header cells to a statement section name."""
         if not header_cells:
             return None
         h = " ".join(header_cells)
@@ -243,140 +575,152 @@ class DocumentProcessor:
             return "FEES"
         return None
 
+    def _cell_text_anchor(self, cell):
+        """Return the cell's layout.text_anchor, or None if it has none."""
+        layout = getattr(cell, 'layout', None)
+        return getattr(layout, 'text_anchor', None) if layout is not None else None
+
     def _extract_transactions(self, document) -> list:
         transactions = []
-        if not document or not hasattr(document, 'pages') or not document.pages:
+        pages = getattr(document, 'pages', None) if document else None
+        if not pages:
             return transactions
-        for page in document.pages:
-            if not hasattr(page, 'tables') or not page.tables:
+        for page in pages:
+            tables = getattr(page, 'tables', None)
+            if not tables:
                 continue
-            for table in page.tables:
+            for table in tables:
                 header_cells = []
-                if hasattr(table, 'header_rows') and table.header_rows:
-                    for hr in table.header_rows:
-                        for c in hr.cells:
-                            if hasattr(c, 'layout') and hasattr(c.layout, 'text_anchor'):
-                                header_cells.append(c.layout.text_anchor.content.lower())
+                for hr in getattr(table, 'header_rows', None) or ():
+                    for c in hr.cells:
+                        ta = self._cell_text_anchor(c)
+                        if ta is not None:
+                            header_cells.append(ta.content.lower())
                 section = self._infer_table_section(header_cells)
-                date_col = desc_col = amount_col = type_col = None
+                cols = {}
                 for i, h in enumerate(header_cells):
-                    if any(w in h for w in ['date', 'transaction date', 'posted date']):
-                        date_col = i
-                    elif any(w in h for w in ['description', 'memo', 'details']):
-                        desc_col = i
-                    elif any(w in h for w in ['amount', 'debit', 'credit', 'withdrawal', 'deposit']):
-                        amount_col = i
-                    elif any(w in h for w in ['type', 'transaction type']):
-                        type_col = i
-                if hasattr(table, 'body_rows') and table.body_rows:
-                    for row in table.body_rows:
-                        if hasattr(row, 'cells') and row.cells:
-                            cells = []
-                            for c in row.cells:
-                                cells.append(c.layout.text_anchor.content.strip() if hasattr(c, 'layout') and hasattr(c.layout, 'text_anchor') else "")
-                            tx = {}
-                            if date_col is not None and date_col < len(cells):
-                                tx["date"] = cells[date_col]
-                            if desc_col is not None and desc_col < len(cells):
-                                tx["description"] = cells[desc_col]
-                            if amount_col is not None and amount_col < len(cells):
-                                try:
-                                    amt = float(cells[amount_col].replace('$', '').replace(',', '').strip())
-                                    tx["amount"] = abs(amt)
-                                    if type_col is not None and type_col < len(cells):
-                                        tx["type"] = "CREDIT" if "credit" in cells[type_col].lower() or "deposit" in cells[type_col].lower() else "DEBIT"
-                                    else:
-                                        tx["type"] = "CREDIT" if amt >= 0 else "DEBIT"
-                                    tx["section"] = section or ("DEPOSITS_AND_ADDITIONS" if amt >= 0 else "WITHDRAWALS")
-                                except ValueError:
-                                    pass
-                            if tx and "amount" in tx:
-                                transactions.append(tx)
-        logger.info(f"Extracted {len(transactions)} transactions")
+                    for keywords, role in _HEADER_KEYWORDS:
+                        if any(k in h for k in keywords):
+                            cols[role] = i
+                            break
+                date_col = cols.get("date")
+                desc_col = cols.get("desc")
+                amount_col = cols.get("amount")
+                type_col = cols.get("type")
+                if amount_col is None:
+                    continue
+                for row in getattr(table, 'body_rows', None) or ():
+                    row_cells = getattr(row, 'cells', None)
+                    if not row_cells:
+                        continue
+                    cells = []
+                    for c in row_cells:
+                        ta = self._cell_text_anchor(c)
+                        cells.append(ta.content.strip() if ta is not None else "")
+                    if amount_col >= len(cells):
+                        continue
+                    try:
+                        amt = float(_AMOUNT_CLEAN.sub('', cells[amount_col]).strip())
+                    except ValueError:
+                        continue
+                    tx = {}
+                    if date_col is not None and date_col < len(cells):
+                        tx["date"] = cells[date_col]
+                    if desc_col is not None and desc_col < len(cells):
+                        tx["description"] = cells[desc_col]
+                    tx["amount"] = abs(amt)
+                    if type_col is not None and type_col < len(cells):
+                        type_cell = cells[type_col].lower()
+                        tx["type"] = "CREDIT" if "credit" in type_cell or "deposit" in type_cell else "DEBIT"
+                    else:
+                        tx["type"] = "CREDIT" if amt >= 0 else "DEBIT"
+                    tx["section"] = section or ("DEPOSITS_AND_ADDITIONS" if amt >= 0 else "WITHDRAWALS")
+                    transactions.append(tx)
+        logger.info("Extracted %d transactions", len(transactions))
         return transactions
 
     def _extract_daily_balances(self, document) -> list:
         balances = []
-        if not document or not hasattr(document, 'entities') or not document.entities:
+        entities = getattr(document, 'entities', None) if document else None
+        if not entities:
             return balances
-        for e in document.entities:
-            t = e.type_ if hasattr(e, 'type_') else ""
-            if "balance" not in t.lower() and "daily" not in t.lower():
+        for e in entities:
+            t = (getattr(e, 'type_', None) or "").lower()
+            if "balance" not in t and "daily" not in t:
                 continue
             b = {}
-            if hasattr(e, 'mention_text'):
-                b["description"] = e.mention_text
-            if hasattr(e, 'properties'):
-                for p in e.properties:
-                    pt = p.type_ if hasattr(p, 'type_') else ""
-                    pv = p.mention_text if hasattr(p, 'mention_text') else ""
-                    if "date" in pt.lower():
-                        b["date"] = pv
-                    elif "balance" in pt.lower() or "amount" in pt.lower():
-                        try:
-                            b["balance"] = float(pv.replace('$', '').replace(',', '').strip())
-                        except ValueError:
-                            pass
+            mention_text = getattr(e, 'mention_text', None)
+            if mention_text is not None:
+                b["description"] = mention_text
+            for p in getattr(e, 'properties', None) or ():
+                pt = (getattr(p, 'type_', None) or "").lower()
+                pv = getattr(p, 'mention_text', None) or ""
+                if "date" in pt:
+                    b["date"] = pv
+                elif "balance" in pt or "amount" in pt:
+                    try:
+                        b["balance"] = float(pv.replace('$', '').replace(',', '').strip())
+                    except ValueError:
+                        pass
             if b and "balance" in b:
                 balances.append(b)
-        if not balances and hasattr(document, 'pages') and document.pages:
-            for page in document.pages:
-                if hasattr(page, 'tables') and page.tables:
-                    for table in page.tables:
-                        txt = ""
-                        if hasattr(table, 'header_rows') and table.header_rows:
-                            for hr in table.header_rows:
-                                for c in hr.cells:
-                                    if hasattr(c, 'layout') and hasattr(c.layout, 'text_anchor'):
-                                        txt += c.layout.text_anchor.content.lower() + " "
-                        if "balance" in txt or "ending" in txt:
-                            if hasattr(table, 'body_rows') and table.body_rows:
-                                for row in table.body_rows:
-                                    if hasattr(row, 'cells') and len(row.cells) >= 2:
-                                        try:
-                                            cs = [c.layout.text_anchor.content.strip() for c in row.cells if hasattr(c, 'layout') and hasattr(c.layout, 'text_anchor')]
-                                            if len(cs) >= 2:
-                                                b = {"date": cs[0], "balance": float(cs[1].replace('$', '').replace(',', '').strip())}
-                                                balances.append(b)
-                                        except (ValueError, IndexError):
-                                            pass
+        if balances:
+            return balances
+        # Entity extraction found nothing; fall back to scanning balance tables
+        pages = getattr(document, 'pages', None)
+        if pages:
+            for page in pages:
+                for table in getattr(page, 'tables', None) or ():
+                    txt = ""
+                    for hr in getattr(table, 'header_rows', None) or ():
+                        for c in hr.cells:
+                            ta = self._cell_text_anchor(c)
+                            if ta is not None:
+                                txt += ta.content.lower() + " "
+                    if "balance" not in txt and "ending" not in txt:
+                        continue
+                    for row in getattr(table, 'body_rows', None) or ():
+                        row_cells = getattr(row, 'cells', None)
+                        if not row_cells or len(row_cells) < 2:
+                            continue
+                        try:
+                            cs = [ta.content.strip() for ta in map(self._cell_text_anchor, row_cells) if ta is not None]
+                            if len(cs) >= 2:
+                                b = {"date": cs[0], "balance": float(cs[1].replace('$', '').replace(',', '').strip())}
+                                balances.append(b)
+                        except (ValueError, IndexError):
+                            pass
         return balances
 
     def _parse_transactions_from_text(self, text: str) -> list:
-        import re
-        from datetime import datetime
         txs = []
         if not text:
             return txs
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if len(line) < 5:
+        for m in _TX_LINE_RE.finditer(text):
+            try:
+                amt = abs(float(_AMOUNT_CLEAN.sub('', m.group('amt'))))
+            except ValueError:
                 continue
-            dm = re.search(r'\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?', line)
-            ams = re.findall(r'\$?([-]?[\d,]+\.?\d*)', line)
-            if dm and ams:
-                try:
-                    valid = [a for a in ams if 10 <= abs(float(a.replace(',', ''))) <= 10_000_000]
-                except (ValueError, TypeError):
-                    valid = []
-                if not valid:
-                    continue
-                try:
-                    amt_str = max(valid, key=lambda x: abs(float(x.replace(',', ''))))
-                    amt = abs(float(amt_str.replace(',', '')))
-                    desc = line[dm.end():line.rfind(amt_str)].strip() if line.rfind(amt_str) > dm.end() else ""
-                    tx_type = "CREDIT" if "deposit" in desc.lower() or "credit" in desc.lower() else "DEBIT"
-                    date_str = dm.group(0)
-                    for fmt in ['%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%m/%d']:
-                        try:
-                            d = datetime.strptime(date_str, fmt)
-                            if '%Y' not in fmt and '%y' not in fmt:
-                                d = d.replace(year=datetime.now().year)
-                            txs.append({"date": d, "description": desc[:200], "amount": amt, "type": tx_type})
-                            break
-                        except ValueError:
-                            continue
-                except (ValueError, TypeError):
-                    pass
+            if not 10 <= amt <= 10_000_000:
+                continue
+            desc = m.group('desc').strip()
+            desc_lower = desc.lower()
+            tx_type = "CREDIT" if "deposit" in desc_lower or "credit" in desc_lower else "DEBIT"
+            d, fmt = _parse_date(m.group('date'), _TX_DATE_FORMATS)
+            if d is None:
+                continue
+            if '%Y' not in fmt and '%y' not in fmt:
+                d = d.replace(year=datetime.now().year)
+            txs.append({"date": d, "description": desc[:200], "amount": amt, "type": tx_type})
         return txs
+
+
+_WORKER_PROCESSOR: Optional[DocumentProcessor] = None
+
+
+def _extract_bank_data_from_bytes(document_bytes: bytes) -> dict:
+    """Process-pool entry point: rebuild the Document and run bank statement extraction."""
+    global _WORKER_PROCESSOR
+    if _WORKER_PROCESSOR is None:
+        _WORKER_PROCESSOR = DocumentProcessor()
+    return _WORKER_PROCESSOR._extract_bank_data(documentai.Document.deserialize(document_bytes))
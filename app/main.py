@@ -4,25 +4,27 @@ Exposes Document AI processing for cross-org access from Project A.
 """
 from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 import logging
+import multiprocessing
 import time
 
-from app.config import settings
+from app.config import configure_logging, get_settings
 from app.document_processor import DocumentProcessor
 
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+settings = get_settings()
+
+configure_logging(settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Document AI REST API",
     description="Document AI processing API for cross-org access (Project B)",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -38,16 +40,42 @@ app.add_middleware(
 async def log_requests(request: Request, call_next):
     """Log every request and response with timing."""
     start = time.time()
-    logger.info(f">>> REQUEST {request.method} {request.url.path} from {request.client.host if request.client else 'unknown'}")
-    logger.info(f"    Headers: Content-Type={request.headers.get('content-type', 'N/A')}")
-    if request.headers.get("X-API-Key"):
-        logger.info("    X-API-Key: [present]")
+    log_enabled = logger.isEnabledFor(logging.INFO)
+    if log_enabled:
+        logger.info(">>> REQUEST %s %s from %s", request.method, request.url.path, request.client.host if request.client else "unknown")
+        logger.info("    Headers: Content-Type=%s", request.headers.get("content-type", "N/A"))
+        if request.headers.get("X-API-Key"):
+            logger.info("    X-API-Key: [present]")
     response = await call_next(request)
-    elapsed = time.time() - start
-    logger.info(f"<<< RESPONSE {response.status_code} in {elapsed:.2f}s")
+    if log_enabled:
+        logger.info("<<< RESPONSE %s in %.2fs", response.status_code, time.time() - start)
     return response
 
 
+def _make_extraction_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: forking after the gRPC client exists is unsafe. Spawned workers
+    # start with unconfigured logging, so set it up the same way as this process.
+    return ProcessPoolExecutor(
+        max_workers=settings.EXTRACTION_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=configure_logging,
+        initargs=(settings.LOG_LEVEL,),
+    )
+
+
+@app.on_event("startup")
+async def startup():
+    """Create the shared DocumentProcessor once so handlers reuse it."""
+    app.state.processor = DocumentProcessor(
+        executor_factory=_make_extraction_pool if settings.EXTRACTION_WORKERS > 0 else None
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.processor.close()
+
+
 def _verify_api_key(x_api_key: Optional[str] = Header(None)):
     """Verify API key if configured."""
     if settings.API_KEY:
@@ -61,6 +89,35 @@ async def health():
     return {"status": "healthy", "service": "document-ai-api"}
 
 
+async def _read_document_input(request: Request, endpoint: str) -> dict:
+    """
+    Parse the request body exactly once, choosing the parser from Content-Type.
+    Returns keyword arguments for DocumentProcessor.aprocess_form/aprocess_bank_statement.
+    """
+    content_type = request.headers.get("content-type", "")
+    logger.info("[%s] Content-Type: %s", endpoint, content_type)
+    if content_type.startswith("multipart/"):
+        form = await request.form()
+        file = form.get("file")
+        if not file or not hasattr(file, "read"):
+            raise HTTPException(status_code=400, detail="File upload required for multipart request")
+        content = await file.read()
+        mime = getattr(file, "content_type", None) or "application/pdf"
+        logger.info("[%s] Processing uploaded file, size=%d bytes, mime=%s", endpoint, len(content), mime)
+        return {"content": content, "mime_type": mime}
+    if content_type.startswith("application/json"):
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail="JSON body must be an object")
+        storage_path = body.get("storage_path")
+        mime_type = body.get("mime_type", "application/pdf")
+        logger.info("[%s] Processing storage_path=%s, mime_type=%s", endpoint, storage_path, mime_type)
+        if not storage_path:
+            raise HTTPException(status_code=400, detail="storage_path required in JSON body")
+        return {"storage_path": storage_path, "mime_type": mime_type}
+    raise HTTPException(status_code=415, detail="Content-Type must be multipart/form-data or application/json")
+
+
 @app.post("/process/form")
 async def process_form(
     request: Request,
@@ -72,29 +129,12 @@ async def process_form(
     - JSON: send {"storage_path": "gs://bucket/path", "mime_type": "application/pdf"}
     """
     _verify_api_key(x_api_key)
-    processor = DocumentProcessor()
+    processor = request.app.state.processor
     try:
-        content_type = request.headers.get("content-type", "")
-        logger.info(f"[process/form] Content-Type: {content_type}")
-        if "multipart/form-data" in content_type:
-            form = await request.form()
-            file = form.get("file")
-            if file and hasattr(file, "read"):
-                content = await file.read()
-                mime = getattr(file, "content_type", None) or "application/pdf"
-                logger.info(f"[process/form] Processing uploaded file, size={len(content)} bytes, mime={mime}")
-                result = processor.process_form(content=content, mime_type=mime)
-                logger.info(f"[process/form] Extracted {len([k for k, v in result.items() if v])} fields")
-                return result
-            raise HTTPException(status_code=400, detail="File upload required for multipart request")
-        body = await request.json()
-        storage_path = body.get("storage_path")
-        mime_type = body.get("mime_type", "application/pdf")
-        logger.info(f"[process/form] Processing storage_path={storage_path}, mime_type={mime_type}")
-        if not storage_path:
-            raise HTTPException(status_code=400, detail="storage_path required in JSON body")
-        result = processor.process_form(storage_path=storage_path, mime_type=mime_type)
-        logger.info(f"[process/form] Extracted {len([k for k, v in result.items() if v])} fields")
+        document_input = await _read_document_input(request, "process/form")
+        result = await processor.aprocess_form(**document_input)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[process/form] Extracted %d fields", sum(1 for v in result.values() if v))
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -116,29 +156,11 @@ async def process_bank_statement(
     - JSON: send {"storage_path": "gs://bucket/path", "mime_type": "application/pdf"}
     """
     _verify_api_key(x_api_key)
-    processor = DocumentProcessor()
+    processor = request.app.state.processor
     try:
-        content_type = request.headers.get("content-type", "")
-        logger.info(f"[process/bank] Content-Type: {content_type}")
-        if "multipart/form-data" in content_type:
-            form = await request.form()
-            file = form.get("file")
-            if file and hasattr(file, "read"):
-                content = await file.read()
-                mime = getattr(file, "content_type", None) or "application/pdf"
-                logger.info(f"[process/bank] Processing uploaded file, size={len(content)} bytes, mime={mime}")
-                result = processor.process_bank_statement(content=content, mime_type=mime)
-                logger.info(f"[process/bank] Extracted {len(result.get('transactions', []))} transactions, {len(result.get('daily_balances', []))} daily balances")
-                return result
-            raise HTTPException(status_code=400, detail="File upload required for multipart request")
-        body = await request.json()
-        storage_path = body.get("storage_path")
-        mime_type = body.get("mime_type", "application/pdf")
-        logger.info(f"[process/bank] Processing storage_path={storage_path}, mime_type={mime_type}")
-        if not storage_path:
-            raise HTTPException(status_code=400, detail="storage_path required in JSON body")
-        result = processor.process_bank_statement(storage_path=storage_path, mime_type=mime_type)
-        logger.info(f"[process/bank] Extracted {len(result.get('transactions', []))} transactions, {len(result.get('daily_balances', []))} daily balances")
+        document_input = await _read_document_input(request, "process/bank")
+        result = await processor.aprocess_bank_statement(**document_input)
+        logger.info("[process/bank] Extracted %d transactions, %d daily balances", len(result.get("transactions", [])), len(result.get("daily_balances", [])))
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -149,6 +171,42 @@ async def process_bank_statement(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/process/bank/batch")
+async def process_bank_statement_batch(
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+):
+    """
+    Process several bank statements with a single Document AI batch request.
+    - JSON: send {"storage_paths": ["gs://bucket/a.pdf", ...], "mime_type": "application/pdf"}
+    """
+    _verify_api_key(x_api_key)
+    processor = request.app.state.processor
+    try:
+        if not request.headers.get("content-type", "").startswith("application/json"):
+            raise HTTPException(status_code=415, detail="Content-Type must be application/json")
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail="JSON body must be an object")
+        storage_paths = body.get("storage_paths")
+        mime_type = body.get("mime_type", "application/pdf")
+        if not storage_paths or not isinstance(storage_paths, list):
+            raise HTTPException(status_code=400, detail="storage_paths list required in JSON body")
+        if not all(isinstance(p, str) and p for p in storage_paths):
+            raise HTTPException(status_code=400, detail="storage_paths must be non-empty strings")
+        logger.info("[process/bank/batch] Processing %d documents, mime_type=%s", len(storage_paths), mime_type)
+        results = await processor.abatch_process(storage_paths, "bank", mime_type)
+        logger.info("[process/bank/batch] Returned %d results", len(results))
+        return {"results": results}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error batch processing bank statements")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8001)
@@ -0,0 +1,132 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from app.document_processor import DocumentProcessor
+
+
+def _fake_list_blobs(names, listed=None):
+    def list_blobs(bucket_name, prefix):
+        blobs = []
+        for name in names:
+            if name.startswith(prefix):
+                blob = mock.Mock()
+                blob.name = name
+                blob.download_as_bytes.return_value = ('{"text": "%s"}' % name).encode()
+                blobs.append(blob)
+        if listed is not None:
+            listed.extend(blobs)
+        return blobs
+    return list_blobs
+
+
+def test_read_batch_output_does_not_match_sibling_indexes():
+    names = [
+        "out/123/1/statement-0.json",
+        "out/123/1/statement-1.json",
+        "out/123/10/statement-0.json",
+        "out/123/11/statement-0.json",
+    ]
+    listed = []
+    client = mock.Mock()
+    client.list_blobs.side_effect = _fake_list_blobs(names, listed)
+    with mock.patch("app.document_processor.get_storage_client", return_value=client):
+        docs = DocumentProcessor()._read_batch_output("gs://bucket/out/123/1")
+    assert [d.text for d in docs] == ["out/123/1/statement-0.json", "out/123/1/statement-1.json"]
+    client.list_blobs.assert_called_once_with("bucket", prefix="out/123/1/")
+    assert len(listed) == 2
+    for blob in listed:
+        blob.delete.assert_called_once_with()
+
+
+def test_gcs_documents_are_cached_per_generation_with_field_mask():
+    from google.cloud import documentai
+    from app import document_processor
+
+    document_processor._DOCUMENT_CACHE.clear()
+    docai = mock.Mock()
+    docai.process_document.return_value = documentai.ProcessResponse(document=documentai.Document(text="hello"))
+    storage_client = mock.Mock()
+    blob = storage_client.bucket.return_value.get_blob.return_value
+    processor = DocumentProcessor()
+    processor._processor_names["bank"] = "projects/p/locations/us/processors/bank"
+    with mock.patch("app.document_processor.get_docai_client", return_value=docai), \
+            mock.patch("app.document_processor.get_storage_client", return_value=storage_client):
+        blob.generation = 1
+        assert processor.process_document(None, "bank", gcs_uri="gs://b/s.pdf").text == "hello"
+        assert processor.process_document(None, "bank", gcs_uri="gs://b/s.pdf").text == "hello"
+        blob.generation = 2
+        processor.process_document(None, "bank", gcs_uri="gs://b/s.pdf")
+    assert docai.process_document.call_count == 2
+    request = docai.process_document.call_args.kwargs["request"]
+    assert list(request.field_mask.paths) == ["text", "entities", "pages.tables"]
+
+
+def test_broken_extraction_pool_falls_back_and_is_recreated():
+    import asyncio
+    from concurrent.futures.process import BrokenProcessPool
+    from google.cloud import documentai
+
+    document = documentai.Document(
+        text="01/05/2024 ACH DEPOSIT $1,500.00\n",
+        entities=[documentai.Document.Entity(type_="bank_name", mention_text="Bank")],
+    )
+    broken = mock.Mock()
+    broken.submit.side_effect = BrokenProcessPool("worker died")
+    factory = mock.Mock(return_value=broken)
+    processor = DocumentProcessor(executor_factory=factory)
+    with mock.patch.object(processor, "process_document_bytes", return_value=documentai.Document.serialize(document)):
+        result = asyncio.run(processor.aprocess_bank_statement(content=b"%PDF"))
+        assert result["bank_name"] == "Bank"
+        assert result["transactions"][0]["amount"] == 1500.0
+        broken.shutdown.assert_called_once()
+        asyncio.run(processor.aprocess_bank_statement(content=b"%PDF"))
+    assert factory.call_count == 2
+
+
+def test_abatch_process_polls_operation_until_done():
+    import asyncio
+
+    operation = mock.Mock()
+    operation.done.side_effect = [False, False, True]
+    processor = DocumentProcessor()
+    with mock.patch("app.document_processor._BATCH_POLL_INTERVAL", 0), \
+            mock.patch.object(processor, "_start_batch", return_value=operation), \
+            mock.patch.object(processor, "_collect_batch_results", return_value=[{"storage_path": "gs://b/a.pdf"}]) as collect:
+        results = asyncio.run(processor.abatch_process(["gs://b/a.pdf"], "bank"))
+    assert results == [{"storage_path": "gs://b/a.pdf"}]
+    assert operation.done.call_count == 3
+    operation.result.assert_not_called()
+    collect.assert_called_once_with(operation, "bank")
+
+
+def test_abatch_process_cancels_operation_on_timeout():
+    import asyncio
+
+    operation = mock.Mock()
+    operation.done.return_value = False
+    processor = DocumentProcessor()
+    with mock.patch("app.document_processor._BATCH_POLL_INTERVAL", 0), \
+            mock.patch("app.document_processor.settings") as settings, \
+            mock.patch.object(processor, "_start_batch", return_value=operation):
+        settings.DOCUMENT_AI_BATCH_TIMEOUT = 0
+        with pytest.raises(TimeoutError):
+            asyncio.run(processor.abatch_process(["gs://b/a.pdf"], "bank"))
+    operation.cancel.assert_called_once_with()
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("01/05/2024 ACH DEPOSIT $1,500.00", [("2024-01-05", "ACH DEPOSIT", 1500.0, "CREDIT")]),
+    ("03/15 CARD PURCHASE 45.10", [(f"{datetime.now().year}-03-15", "CARD PURCHASE", 45.1, "DEBIT")]),
+    ("01/05/2024 MOBILE CREDIT 25.00", [("2024-01-05", "MOBILE CREDIT", 25.0, "CREDIT")]),
+    ("01/05/2024 PAYROLL 2,000.00 9,500.00", [("2024-01-05", "PAYROLL 2,000.00", 9500.0, "DEBIT")]),
+    ("01/05/2024 CHECK 1001 1500", []),
+    ("01/05/2024 SERVICE FEE 5.00", []),
+    ("01/05/2024 WIRE OUT 10,000,001.00", []),
+])
+def test_parse_transactions_from_text(line, expected):
+    txs = DocumentProcessor()._parse_transactions_from_text(f"Statement header\n{line}\n")
+    assert [
+        (tx["date"].strftime("%Y-%m-%d"), tx["description"], tx["amount"], tx["type"]) for tx in txs
+    ] == expected
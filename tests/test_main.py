@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_batch_rejects_invalid_bodies():
+    with TestClient(app) as client:
+        r = client.post("/process/bank/batch", json=[1])
+        assert r.status_code == 400
+        r = client.post("/process/bank/batch", json={"storage_paths": ["gs://b/a.pdf", 3]})
+        assert r.status_code == 400
+        r = client.post("/process/bank/batch", content=b"x", headers={"content-type": "text/plain"})
+        assert r.status_code == 415